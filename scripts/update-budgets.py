@@ -11,14 +11,20 @@ updates expected budgets in test files, and loops until all tests pass.
 Formats ExUnits as: ExUnits(memory = 129_528, steps = 37_067868)
 """
 
+import os
 import re
 import sys
 import subprocess
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 INT_MAX = 2_147_483_647
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 MAX_ITERATIONS = 25
+TAIL_LINES = 40  # sbt output lines kept for reporting non-budget failures
 
 # Directories containing test files
 TEST_DIRS = [
@@ -33,6 +39,17 @@ TEST_DIRS = [
 
 ANSI_RE = re.compile(r"\x1b\[[0-9;]*[a-zA-Z]|\[0J")
 
+# sbt output patterns, see SbtOutputParser.feed
+EXPECTED_GOT_RE = re.compile(
+    r"expected: ExUnits\((\d+),(\d+)\),|but got: ExUnits\((\d+),(\d+)\);"
+)
+DID_NOT_EQUAL_RE = re.compile(
+    r"ExUnits\((\d+),\s*(\d+)\) did not equal ExUnits\((\d+),\s*(\d+)\)"
+)
+SIZE_MISMATCH_RE = re.compile(r"(\d+) did not equal (\d+) \((\w+\.scala):(\d+)\)")
+SBT_PREFIX_RE = re.compile(r"^\[(?:error|info)\]\s*")
+CLASS_RE = re.compile(r"^[a-z][\w.]*[A-Z]\w*$")
+
 
 # ── Formatting ──────────────────────────────────────────────────────────
 
@@ -48,90 +65,168 @@ def fmt_exunits(mem: int, steps: int) -> str:
     return f"ExUnits(memory = {fmt_num(mem)}, steps = {fmt_num(steps)})"
 
 
-def strip_num(s: str) -> int:
-    return int(s.replace("_", "").rstrip("L"))
+def strip_num(s: bytes) -> bytes:
+    """Normalize a Scala integer literal to its plain digits: 37_067868L -> 37067868."""
+    return s.replace(b"_", b"").rstrip(b"L")
 
 
 def strip_ansi(text: str) -> str:
+    """Strip ANSI escape codes from one line of sbt output."""
+    # Plain lines are returned as is rather than copied by the regex.
+    if "\x1b" not in text and "[0J" not in text:
+        return text
     return ANSI_RE.sub("", text)
 
 
 # ── Parsing ─────────────────────────────────────────────────────────────
 
 
-def parse_failures(output: str) -> tuple[dict, list]:
-    """Parse test output for budget mismatches.
+class SbtOutputParser:
+    """Incremental parser for sbt test output, fed one line at a time.
 
-    Returns:
-        exunits_map: {(old_mem, old_steps): (new_mem, new_steps)}
-        size_mismatches: [(old_size, new_size, filename, line)]
+    Lines are parsed as they arrive, so the full log is never held in memory;
+    only the last TAIL_LINES lines are kept, since sbt reports errors at the end.
     """
-    text = strip_ansi(output)
-    exunits_map: dict[tuple[int, int], tuple[int, int]] = {}
-
-    # Pattern 1: assertEvalWithBudget / assertEvalWithinBudget output
-    #   "expected: ExUnits(mem,steps),\n...\nbut got: ExUnits(mem,steps);"
-    for m in re.finditer(
-        r"expected: ExUnits\((\d+),(\d+)\),.*?but got: ExUnits\((\d+),(\d+)\);",
-        text,
-        re.DOTALL,
-    ):
-        old_mem, old_steps, new_mem, new_steps = map(int, m.groups())
-        exunits_map[(old_mem, old_steps)] = (new_mem, new_steps)
-
-    # Pattern 2: standard assert(x == y) with ExUnits
-    #   "ExUnits(actual_mem, actual_steps) did not equal ExUnits(expected_mem, expected_steps)"
-    for m in re.finditer(
-        r"ExUnits\((\d+),\s*(\d+)\) did not equal ExUnits\((\d+),\s*(\d+)\)", text
-    ):
-        actual_mem, actual_steps, expected_mem, expected_steps = map(int, m.groups())
-        exunits_map[(expected_mem, expected_steps)] = (actual_mem, actual_steps)
-
-    # Pattern 3: plain integer mismatches (e.g. bitSize assertions)
-    #   "83 did not equal 123 (ExprSizeAndBudgetTest.scala:74)"
-    size_mismatches = []
-    for m in re.finditer(
-        r"(\d+) did not equal (\d+) \((\w+\.scala):(\d+)\)", text
-    ):
-        actual, expected, filename, line = m.groups()
-        actual_int, expected_int = int(actual), int(expected)
-        # Skip if it looks like ExUnits components (already handled above)
-        if actual_int == expected_int:
-            continue
-        key_fwd = (expected_int, actual_int)
-        key_rev = (actual_int, expected_int)
-        if key_fwd not in exunits_map and key_rev not in exunits_map:
-            size_mismatches.append((expected_int, actual_int, filename, int(line)))
-
-    return exunits_map, size_mismatches
 
+    def __init__(self):
+        self.exunits_map: dict[tuple[int, int], tuple[int, int]] = {}
+        self.failing_classes: list[str] = []
+        self.tail: deque[str] = deque(maxlen=TAIL_LINES)
+        self._int_mismatches: list[tuple[int, int, str, int]] = []
+        self._expected: tuple[int, int] | None = None
+        self._in_failed_block = False
+        # Set when sbt reports a run that selected no tests at all
+        self.no_tests = False
+
+    def feed(self, line: str):
+        self.tail.append(line)
+        # Almost every line of a test run is irrelevant here. Substring checks
+        # on the raw line let those skip ANSI stripping and the regexes.
+        has_exunits = "ExUnits(" in line
+        has_not_equal = "did not equal" in line
+        # "No tests to run for scalusJVM / Test / testOnly", "No tests were executed."
+        if "No tests to run" in line or "No tests were executed" in line:
+            self.no_tests = True
+        if not (
+            has_exunits
+            or has_not_equal
+            or self._in_failed_block
+            or "Failed tests:" in line
+        ):
+            return
+        text = strip_ansi(line)
+
+        if has_exunits:
+            # Pattern 1: assertEvalWithBudget / assertEvalWithinBudget output
+            #   "expected: ExUnits(mem,steps),\n...\nbut got: ExUnits(mem,steps);"
+            # The two halves are on different lines: hold the expected value
+            # until the matching "but got" arrives.
+            for m in EXPECTED_GOT_RE.finditer(text):
+                if m.group(1) is not None:
+                    if self._expected is None:
+                        self._expected = (int(m.group(1)), int(m.group(2)))
+                elif self._expected is not None:
+                    self.exunits_map[self._expected] = (
+                        int(m.group(3)),
+                        int(m.group(4)),
+                    )
+                    self._expected = None
+
+        if has_exunits and has_not_equal:
+            # Pattern 2: standard assert(x == y) with ExUnits
+            #   "ExUnits(actual_mem, actual_steps) did not equal ExUnits(expected_mem, expected_steps)"
+            for m in DID_NOT_EQUAL_RE.finditer(text):
+                actual_mem, actual_steps, expected_mem, expected_steps = map(
+                    int, m.groups()
+                )
+                self.exunits_map[(expected_mem, expected_steps)] = (
+                    actual_mem,
+                    actual_steps,
+                )
 
-def parse_failing_classes(output: str) -> list[str]:
-    """Extract fully-qualified failing test class names from sbt output."""
-    text = strip_ansi(output)
-    classes = []
-    in_block = False
-    for line in text.split("\n"):
-        cleaned = re.sub(r"^\[(?:error|info)\]\s*", "", line).strip()
+        if has_not_equal:
+            # Pattern 3: plain integer mismatches (e.g. bitSize assertions)
+            #   "83 did not equal 123 (ExprSizeAndBudgetTest.scala:74)"
+            for m in SIZE_MISMATCH_RE.finditer(text):
+                actual, expected, filename, line_no = m.groups()
+                actual_int, expected_int = int(actual), int(expected)
+                if actual_int != expected_int:
+                    self._int_mismatches.append(
+                        (expected_int, actual_int, filename, int(line_no))
+                    )
+
+        # Failing test classes are listed after "Failed tests:"
+        cleaned = SBT_PREFIX_RE.sub("", text).strip()
         if cleaned == "Failed tests:":
-            in_block = True
-            continue
-        if in_block:
+            self._in_failed_block = True
+        elif self._in_failed_block:
             # Class names are tab-indented after "Failed tests:"
-            if re.match(r"^[a-z][\w.]*[A-Z]\w*$", cleaned):
-                classes.append(cleaned)
+            if CLASS_RE.match(cleaned):
+                if cleaned not in self.failing_classes:
+                    self.failing_classes.append(cleaned)
             else:
-                in_block = False
-    return list(dict.fromkeys(classes))  # dedupe, preserve order
+                self._in_failed_block = False
+
+    def failures(self) -> tuple[dict, list]:
+        """Budget mismatches seen so far.
+
+        Returns:
+            exunits_map: {(old_mem, old_steps): (new_mem, new_steps)}
+            size_mismatches: [(old_size, new_size, filename, line)]
+        """
+        size_mismatches = []
+        for expected, actual, filename, line_no in self._int_mismatches:
+            # Skip if it looks like ExUnits components (already handled above)
+            if (
+                (expected, actual) not in self.exunits_map
+                and (actual, expected) not in self.exunits_map
+            ):
+                size_mismatches.append((expected, actual, filename, line_no))
+        return self.exunits_map, size_mismatches
 
 
 # ── Statistics ──────────────────────────────────────────────────────────
 
 
+def record_changes(
+    all_exunits: dict[tuple[int, int], tuple[int, int]],
+    all_sizes: dict[tuple[str, int], tuple[int, int]],
+    exunits_map: dict[tuple[int, int], tuple[int, int]],
+    size_mismatches: list,
+):
+    """Fold one iteration's mismatches into the running totals.
+
+    ExUnits changes are keyed by the value originally in the tree and sizes
+    by (filename, line), so a value that changes again in a later iteration
+    (A -> B, then B -> C) is recorded once as A -> C. A value that ends up
+    back at its original is dropped.
+    """
+    # Current value -> every original value that was rewritten to it, taken
+    # before this iteration so its own changes don't chain into each other.
+    origins: dict[tuple[int, int], list[tuple[int, int]]] = {}
+    for orig, cur in all_exunits.items():
+        origins.setdefault(cur, []).append(orig)
+    for old, new in exunits_map.items():
+        for orig in origins.get(old, [old]):
+            if new == orig:
+                all_exunits.pop(orig, None)
+            else:
+                all_exunits[orig] = new
+
+    for old_sz, new_sz, fname, line in size_mismatches:
+        prev = all_sizes.get((fname, line))
+        orig_sz = prev[0] if prev else old_sz
+        if new_sz == orig_sz:
+            all_sizes.pop((fname, line), None)
+        else:
+            all_sizes[(fname, line)] = (orig_sz, new_sz)
+
+
 def report_statistics(
-    exunits_map: dict[tuple[int, int], tuple[int, int]], size_mismatches: list
+    exunits_map: dict[tuple[int, int], tuple[int, int]],
+    size_changes: dict[tuple[str, int], tuple[int, int]],
 ):
-    if not exunits_map and not size_mismatches:
+    if not exunits_map and not size_changes:
         print("  No budget changes detected.")
         return
 
@@ -168,9 +263,9 @@ def report_statistics(
             f"range [{min(steps_pcts):+.2f}%, {max(steps_pcts):+.2f}%]"
         )
 
-    if size_mismatches:
-        print(f"  Size changes: {len(size_mismatches)}")
-        for old_sz, new_sz, fname, line in size_mismatches:
+    if size_changes:
+        print(f"  Size changes: {len(size_changes)}")
+        for (fname, line), (old_sz, new_sz) in size_changes.items():
             pct = (new_sz - old_sz) / old_sz * 100 if old_sz else 0
             print(f"    {fname}:{line}  {old_sz} -> {new_sz} ({pct:+.1f}%)")
 
@@ -193,154 +288,314 @@ def report_statistics(
 # ── File Updates ────────────────────────────────────────────────────────
 
 
-def find_test_files() -> list[Path]:
-    files = []
-    for d in TEST_DIRS:
-        if d.exists():
-            files.extend(d.rglob("*.scala"))
-    return files
+_test_files_cache: list[str] | None = None
+
 
+def find_test_files() -> list[str]:
+    """List test sources once per run; later iterations reuse the same list.
 
+    Walks TEST_DIRS with os.scandir, which classifies entries from the
+    directory listing itself instead of issuing a stat per path.
+    """
+    global _test_files_cache
+    if _test_files_cache is None:
+        files = []
+        stack = [str(d) for d in TEST_DIRS if d.exists()]
+        while stack:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.name.endswith(".scala") and entry.is_file(
+                        follow_symlinks=False
+                    ):
+                        files.append(entry.path)
+        _test_files_cache = files
+    return _test_files_cache
+
+
+# path -> (st_mtime_ns, contains "ExUnits(") as of the last read
+_file_meta: dict[str, tuple[int, bool]] = {}
+
+
+# Test sources are matched as bytes to avoid decoding/encoding every file.
+# The first alternative is the exact form fmt_exunits produces, so files this
+# script has already rewritten match without trying the optional whitespace
+# and labels of the general form.
 EXUNITS_RE = re.compile(
-    r"ExUnits\(\s*(?:memory\s*=\s*)?([0-9_]+L?)\s*,\s*(?:steps\s*=\s*)?([0-9_]+L?)\s*\)"
+    rb"ExUnits\(memory = ([0-9_]+L?), steps = ([0-9_]+L?)\)"
+    rb"|ExUnits\(\s*(?:memory\s*=\s*)?([0-9_]+L?)\s*,\s*(?:steps\s*=\s*)?([0-9_]+L?)\s*\)"
 )
 
+SIZE_IS_RE = re.compile(rb"\bsize is (\d+)\b")
+
+# ExUnits literals and "size is N" test names, matched in one scan per file.
+BUDGET_RE = re.compile(EXUNITS_RE.pattern + b"|" + SIZE_IS_RE.pattern)
+
+
+def replace_size_is(text: bytes, size_map: dict[int, int]) -> bytes:
+    """Rewrite "size is N" test names whose N is a key of size_map."""
 
-def replace_exunits(
+    def replacer(m: re.Match) -> bytes:
+        new_sz = size_map.get(int(m.group(1)))
+        return b"size is %d" % new_sz if new_sz is not None else m.group(0)
+
+    return SIZE_IS_RE.sub(replacer, text)
+
+
+def replace_on_lines(
+    content: bytes, rules: list[tuple[int, int, int]], size_map: dict[int, int]
+) -> bytes:
+    """Replace old_sz with new_sz on the given 1-based lines of content.
+
+    Edits are spliced in by byte offset, last line first so earlier offsets
+    stay valid, instead of splitting the whole file into lines. "size is N"
+    names on these lines are rewritten after the size edit, the same order
+    as for a whole file, so a rewritten name is never edited a second time.
+    """
+    by_line: dict[int, list[tuple[int, int]]] = {}
+    for old_sz, new_sz, line_no in rules:
+        by_line.setdefault(line_no, []).append((old_sz, new_sz))
+
+    # Offsets of line starts, only as far as the last edited line needs
+    last_line = max(by_line)
+    starts = [0]
+    pos = 0
+    while len(starts) <= last_line:
+        pos = content.find(b"\n", pos) + 1
+        if pos == 0:
+            break
+        starts.append(pos)
+
+    for line_no in sorted(by_line, reverse=True):
+        idx = line_no - 1
+        if not 0 <= idx < len(starts):
+            continue
+        start = starts[idx]
+        end = starts[idx + 1] - 1 if idx + 1 < len(starts) else len(content)
+        line = content[start:end]
+        for old_sz, new_sz in by_line[line_no]:
+            line = line.replace(b"%d" % old_sz, b"%d" % new_sz)
+        line = replace_size_is(line, size_map)
+        content = content[:start] + line + content[end:]
+    return content
+
+
+def apply_all_replacements(
     exunits_map: dict[tuple[int, int], tuple[int, int]],
-) -> list[str]:
-    """Replace ExUnits values in all test files. Returns list of updated file paths."""
-    if not exunits_map:
-        return []
-
-    updated = []
-
-    def replacer(m: re.Match) -> str:
-        mem_int = strip_num(m.group(1))
-        steps_int = strip_num(m.group(2))
-        if (mem_int, steps_int) in exunits_map:
-            new_mem, new_steps = exunits_map[(mem_int, steps_int)]
-            return fmt_exunits(new_mem, new_steps)
-        return m.group(0)
-
-    for fpath in find_test_files():
-        content = fpath.read_text()
-        new_content = EXUNITS_RE.sub(replacer, content)
-        if new_content != content:
-            fpath.write_text(new_content)
-            updated.append(str(fpath.relative_to(PROJECT_ROOT)))
-
-    return updated
-
-
-def replace_sizes(size_mismatches: list) -> list[str]:
-    """Replace plain integer size assertions in test files."""
-    if not size_mismatches:
-        return []
-
-    updated = []
-
-    for fpath in find_test_files():
-        content = fpath.read_text()
-        new_content = content
-
-        for old_sz, new_sz, fname, line_no in size_mismatches:
-            if fpath.name == fname:
-                lines = new_content.split("\n")
-                idx = line_no - 1
-                if 0 <= idx < len(lines):
-                    old_line = lines[idx]
-                    new_line = old_line.replace(str(old_sz), str(new_sz))
-                    if new_line != old_line:
-                        lines[idx] = new_line
-                        new_content = "\n".join(lines)
-
-        # Also update test name strings that reference the old size
-        for old_sz, new_sz, fname, _ in size_mismatches:
-            if fpath.name == fname:
-                new_content = re.sub(
-                    rf"size is {old_sz}",
-                    f"size is {new_sz}",
-                    new_content,
-                )
+    size_mismatches: list,
+) -> set[str]:
+    """Apply ExUnits and size replacements to all test files in a single pass.
+
+    Each file is read once and written back only if its content changed.
+    Returns the set of updated file paths.
+    """
+    if not exunits_map and not size_mismatches:
+        return set()
+
+    # Size assertions are keyed by file name; bucket them once so each
+    # file only looks at its own rules.
+    by_name: dict[str, list[tuple[int, int, int]]] = {}
+    for old_sz, new_sz, fname, line_no in size_mismatches:
+        by_name.setdefault(fname, []).append((old_sz, new_sz, line_no))
+
+    # Replacement text for each old value, formatted once up front. Keyed by
+    # digit strings so matches can be looked up without int parsing; most
+    # ExUnits literals in the tree are not in the map.
+    exunits_repl = {
+        (b"%d" % mem, b"%d" % steps): fmt_exunits(*new).encode()
+        for (mem, steps), new in exunits_map.items()
+    }
+
+    def process_one(fpath: str) -> str | None:
+        """Rewrite one file; returns its relative path if it was updated."""
+        rules = by_name.get(os.path.basename(fpath))
+        if not exunits_map and not rules:
+            return None
+
+        # A file that had no ExUnits last time and hasn't been modified since
+        # cannot match now either.
+        mtime_ns = os.stat(fpath).st_mtime_ns
+        prev = _file_meta.get(fpath)
+        if not rules and prev is not None and prev == (mtime_ns, False):
+            return None
+
+        with open(fpath, "rb") as f:
+            content = f.read()
+        _file_meta[fpath] = (mtime_ns, b"ExUnits(" in content)
+
+        # Test names referencing the old size are only rewritten in the
+        # file the size assertion came from.
+        # If one old size is reported with several new values, the first wins.
+        size_map: dict[int, int] = {}
+        for old_sz, new_sz, _ in rules or ():
+            size_map.setdefault(old_sz, new_sz)
+        # Lines with a size edit get their "size is N" names rewritten by
+        # replace_on_lines, after the edit itself.
+        rule_lines = {line_no for _, _, line_no in rules or ()}
+
+        def replacer(m: re.Match) -> bytes:
+            # lastindex tells which alternative matched: 2 canonical ExUnits,
+            # 4 general ExUnits, 5 "size is N"
+            last = m.lastindex
+            if last == 5:
+                new_sz = size_map.get(int(m.group(5)))
+                if new_sz is None:
+                    return m.group(0)
+                if content.count(b"\n", 0, m.start()) + 1 in rule_lines:
+                    return m.group(0)
+                return b"size is %d" % new_sz
+            key = (strip_num(m.group(last - 1)), strip_num(m.group(last)))
+            return exunits_repl.get(key, m.group(0))
+
+        # Most files have nothing to replace: a plain substring check is much
+        # cheaper than a regex pass that ends up returning the same text.
+        if (exunits_map and b"ExUnits(" in content) or (
+            size_map and b"size is " in content
+        ):
+            new_content = BUDGET_RE.sub(replacer, content)
+        else:
+            new_content = content
 
-        if new_content != content:
-            fpath.write_text(new_content)
-            updated.append(str(fpath.relative_to(PROJECT_ROOT)))
+        if rules:
+            new_content = replace_on_lines(new_content, rules, size_map)
 
-    return list(dict.fromkeys(updated))
+        if new_content == content:
+            return None
+        with open(fpath, "wb") as f:
+            f.write(new_content)
+        _file_meta.pop(fpath, None)
+        return os.path.relpath(fpath, PROJECT_ROOT)
+
+    # File reads and writes release the GIL, so threads overlap the I/O.
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 8) as ex:
+        results = ex.map(process_one, find_test_files())
+        return {f for f in results if f is not None}
 
 
 # ── Test Runners ────────────────────────────────────────────────────────
 
 
-def run_sbtn(cmd: str, timeout: int = 600) -> tuple[str, int]:
-    """Run an sbtn command and return (output, returncode)."""
+def run_sbtn(
+    cmd: str, parser: SbtOutputParser | None = None, timeout: int = 600
+) -> tuple[SbtOutputParser, int]:
+    """Run an sbtn command, streaming its output into a parser.
+
+    Returns (parser, returncode). Pass an existing parser to accumulate
+    results across several commands.
+    """
     print(f"  $ sbtn {cmd}")
-    result = subprocess.run(
+    if parser is None:
+        parser = SbtOutputParser()
+    deadline = time.monotonic() + timeout
+    with subprocess.Popen(
         ["sbtn", cmd],
-        capture_output=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
         text=True,
-        timeout=timeout,
+        bufsize=1,
         cwd=PROJECT_ROOT,
-    )
-    return result.stdout + result.stderr, result.returncode
-
-
-def run_specific_tests(classes: list[str]) -> tuple[str, int]:
+    ) as proc:
+        timer = threading.Timer(timeout, proc.kill)
+        timer.start()
+        try:
+            for line in proc.stdout:
+                parser.feed(line)
+        finally:
+            timer.cancel()
+        returncode = proc.wait()
+    if returncode != 0 and time.monotonic() >= deadline:
+        raise subprocess.TimeoutExpired(["sbtn", cmd], timeout)
+    return parser, returncode
+
+
+# sbt subproject that owns the tests under each top-level directory
+TEST_PROJECTS = {
+    "scalus-core": "scalusJVM",
+    "scalus-examples": "scalusExamplesJVM",
+}
+
+
+def test_project(cls: str) -> str:
+    """sbt subproject run_specific_tests sends a test class to."""
+    if "benchmarks" in cls or cls.startswith("scalus.examples"):
+        return "scalusExamplesJVM"
+    return "scalusJVM"
+
+
+def run_specific_tests(classes: list[str]) -> tuple[SbtOutputParser, int]:
     """Run specific test classes across the right sbt subprojects."""
     core_classes = []
     example_classes = []
 
     for cls in classes:
-        if "benchmarks" in cls or cls.startswith("scalus.examples"):
+        if test_project(cls) == "scalusExamplesJVM":
             example_classes.append(cls)
         else:
             core_classes.append(cls)
 
-    output = ""
+    parser = SbtOutputParser()
     returncode = 0
 
     if core_classes:
-        out, rc = run_sbtn(f"scalusJVM/testOnly {' '.join(core_classes)}")
-        output += out
+        _, rc = run_sbtn(f"scalusJVM/testOnly {' '.join(core_classes)}", parser)
         if rc != 0:
             returncode = rc
 
     if example_classes:
-        out, rc = run_sbtn(f"scalusExamplesJVM/testOnly {' '.join(example_classes)}")
-        output += out
+        _, rc = run_sbtn(
+            f"scalusExamplesJVM/testOnly {' '.join(example_classes)}", parser
+        )
         if rc != 0:
             returncode = rc
 
-    return output, returncode
+    return parser, returncode
 
 
-# ── Main ────────────────────────────────────────────────────────────────
+def covers_files(classes: list[str], files: set[str]) -> bool:
+    """Whether running `classes` with run_specific_tests exercises every file.
 
+    A file is covered when the class named after its path
+    (scalus-core/jvm/src/test/scala/scalus/foo/FooTest.scala -> scalus.foo.FooTest)
+    was run, and was routed to the subproject that owns the file. Files
+    outside TEST_PROJECTS are never covered.
+    """
+    tested = set(classes)
+    for f in files:
+        path = f.replace(os.sep, "/")
+        project = TEST_PROJECTS.get(path.split("/", 1)[0])
+        _, sep, source = path.partition("/src/test/scala/")
+        if project is None or not sep:
+            return False
+        cls = source.removesuffix(".scala").replace("/", ".")
+        if cls not in tested or test_project(cls) != project:
+            return False
+    return True
 
-def main():
-    dry_run = "--dry" in sys.argv
 
-    all_exunits: dict[tuple[int, int], tuple[int, int]] = {}
-    all_sizes: list = []
+# ── Main ────────────────────────────────────────────────────────────────
 
-    # Step 1: Run sbtn quick
-    print("\n[1/4] Running sbtn quick...")
-    output, rc = run_sbtn("quick")
 
-    if rc == 0:
-        print("  All tests passed! Nothing to update.")
-        return 0
+def iterate_fixes(
+    parser: SbtOutputParser,
+    rc: int,
+    all_exunits: dict[tuple[int, int], tuple[int, int]],
+    all_sizes: dict[tuple[str, int], tuple[int, int]],
+    dry_run: bool = False,
+) -> tuple[SbtOutputParser, int, set[str], bool]:
+    """Parse failures, update test files and rerun failing tests until they pass.
 
-    # Step 2: Iteratively fix failures
-    print(f"\n[2/4] Fixing budget mismatches (up to {MAX_ITERATIONS} iterations)...")
+    Starts from the parsed output of a failed run. Returns
+    (parser, returncode, updated_files, verified) for the last run, where
+    `verified` tells whether that run passed and covered every updated file.
+    """
     failing_classes: list[str] = []
-    total_updated_files: set[str] = set()
+    updated_files: set[str] = set()
+    verified = False
 
     for iteration in range(MAX_ITERATIONS):
-        exunits_map, size_mismatches = parse_failures(output)
-        new_classes = parse_failing_classes(output)
+        exunits_map, size_mismatches = parser.failures()
+        new_classes = parser.failing_classes
 
         if new_classes:
             failing_classes = new_classes
@@ -356,24 +611,24 @@ def main():
             if failing_classes:
                 print("  No budget-related mismatches found, but tests still failing.")
                 print("  This may be a non-budget test failure.")
+            print("  Last lines of sbt output:")
+            for line in parser.tail:
+                print(f"    {strip_ansi(line).rstrip()}")
             break
 
-        all_exunits.update(exunits_map)
-        all_sizes.extend(size_mismatches)
+        record_changes(all_exunits, all_sizes, exunits_map, size_mismatches)
 
         if dry_run:
             print("  (dry run — not updating files)")
             break
 
         # Apply replacements
-        updated = replace_exunits(exunits_map)
-        updated += replace_sizes(size_mismatches)
-        updated = list(dict.fromkeys(updated))
+        updated = apply_all_replacements(exunits_map, size_mismatches)
 
         if updated:
-            for f in updated:
+            for f in sorted(updated):
                 print(f"    Updated: {f}")
-            total_updated_files.update(updated)
+            updated_files |= updated
         else:
             print("  WARNING: No files were updated despite mismatches found.")
             print("  Unrecognized ExUnits format in test files?")
@@ -381,16 +636,44 @@ def main():
 
         if not failing_classes:
             print("  Could not determine failing test classes. Running sbtn quick...")
-            output, rc = run_sbtn("quick")
+            parser, rc = run_sbtn("quick")
+            covered = True
         else:
-            output, rc = run_specific_tests(failing_classes)
+            parser, rc = run_specific_tests(failing_classes)
+            covered = covers_files(failing_classes, updated_files)
+        # A run that selected no tests verifies nothing
+        covered = covered and not parser.no_tests
 
         if rc == 0:
             print("  All previously-failing tests now pass!")
+            verified = covered
             break
     else:
         print(f"\n  WARNING: Did not converge after {MAX_ITERATIONS} iterations")
 
+    return parser, rc, updated_files, verified
+
+
+def main():
+    dry_run = "--dry" in sys.argv
+
+    all_exunits: dict[tuple[int, int], tuple[int, int]] = {}
+    all_sizes: dict[tuple[str, int], tuple[int, int]] = {}
+
+    # Step 1: Run sbtn quick
+    print("\n[1/4] Running sbtn quick...")
+    parser, rc = run_sbtn("quick")
+
+    if rc == 0:
+        print("  All tests passed! Nothing to update.")
+        return 0
+
+    # Step 2: Iteratively fix failures
+    print(f"\n[2/4] Fixing budget mismatches (up to {MAX_ITERATIONS} iterations)...")
+    parser, rc, total_updated_files, verified = iterate_fixes(
+        parser, rc, all_exunits, all_sizes, dry_run
+    )
+
     # Step 3: Report statistics
     print(f"\n[3/4] Budget change statistics ({len(all_exunits)} total changes):")
     report_statistics(all_exunits, all_sizes)
@@ -399,68 +682,44 @@ def main():
         print(f"\n  Files that would be updated: {len(total_updated_files)}")
         return 0
 
-    # Step 4: Final verification
-    print("\n[4/4] Final verification with sbtn quick...")
-    output, rc = run_sbtn("quick")
+    # Step 4: Final verification. Needed only when files were updated but the
+    # last passing run did not exercise all of them; a failing run is final.
+    extra_fixes = False
+    if verified:
+        print("\n[4/4] Final verification skipped: updated tests already pass.")
+    elif rc == 0 or total_updated_files:
+        print("\n[4/4] Final verification with sbtn quick...")
+        parser, rc = run_sbtn("quick")
+
+        # Tree-wide replacements can surface mismatches in tests outside the
+        # previously failing classes: fix those too, then check once more.
+        exunits_map, size_mismatches = parser.failures()
+        if rc != 0 and (exunits_map or size_mismatches):
+            print(f"  Found {len(exunits_map)} more ExUnits mismatches from full test suite.")
+            print("  Running additional fix iterations...")
+            extra_fixes = True
+            parser, rc, updated, verified = iterate_fixes(
+                parser, rc, all_exunits, all_sizes
+            )
+            total_updated_files |= updated
+            if rc == 0 and not verified:
+                print("\n  Final check with sbtn quick...")
+                parser, rc = run_sbtn("quick")
+    else:
+        print("\n[4/4] Final verification skipped: no files were updated.")
 
     if rc == 0:
-        print("  All tests passed!")
+        print("\n  All tests passed!")
+        if extra_fixes:
+            print(f"\n  Total statistics ({len(all_exunits)} changes):")
+            report_statistics(all_exunits, all_sizes)
         print(f"\n  Updated {len(total_updated_files)} files:")
         for f in sorted(total_updated_files):
             print(f"    {f}")
         return 0
 
-    # If still failing, try one more iteration cycle on the full suite
-    exunits_map, size_mismatches = parse_failures(output)
-    new_classes = parse_failing_classes(output)
-
-    if exunits_map or size_mismatches:
-        print(f"  Found {len(exunits_map)} more ExUnits mismatches from full test suite.")
-        print("  Running additional fix iterations...")
-
-        for iteration in range(MAX_ITERATIONS):
-            all_exunits.update(exunits_map)
-            all_sizes.extend(size_mismatches)
-
-            updated = replace_exunits(exunits_map)
-            updated += replace_sizes(size_mismatches)
-            updated = list(dict.fromkeys(updated))
-
-            if updated:
-                for f in updated:
-                    print(f"    Updated: {f}")
-                total_updated_files.update(updated)
-            else:
-                break
-
-            if new_classes:
-                output, rc = run_specific_tests(new_classes)
-            else:
-                output, rc = run_sbtn("quick")
-
-            if rc == 0:
-                break
-
-            exunits_map, size_mismatches = parse_failures(output)
-            new_classes = parse_failing_classes(output)
-
-            if not exunits_map and not size_mismatches:
-                break
-
-        # Final check
-        output, rc = run_sbtn("quick")
-        if rc == 0:
-            print("\n  All tests passed!")
-            print(f"\n  Total statistics ({len(all_exunits)} changes):")
-            report_statistics(all_exunits, all_sizes)
-            print(f"\n  Updated {len(total_updated_files)} files:")
-            for f in sorted(total_updated_files):
-                print(f"    {f}")
-            return 0
-
-    new_classes = parse_failing_classes(output)
     print("  Some tests still failing after all iterations:")
-    for cls in new_classes:
+    for cls in parser.failing_classes:
         print(f"    {cls}")
     print(f"\n  Total statistics ({len(all_exunits)} changes):")
     report_statistics(all_exunits, all_sizes)